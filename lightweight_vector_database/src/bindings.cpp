@@ -1,5 +1,6 @@
 #include <pybind11/pybind11.h>
 #include <pybind11/stl.h>
+#include <pybind11/numpy.h>
 #include <pybind11/complex.h>
 #include <pybind11/functional.h>
 #include <pybind11/chrono.h>
@@ -12,6 +13,16 @@ namespace py = pybind11;
 using namespace hnsw;
 using namespace sq;
 
+// Vectors passed as numpy arrays (or any buffer) are read directly instead of being boxed into Python floats
+using FloatArray = py::array_t<float, py::array::c_style | py::array::forcecast>;
+
+static const float* vector_data(const FloatArray& vec, size_t vector_dimension) {
+    if (vec.ndim() != 1 || static_cast<size_t>(vec.shape(0)) != vector_dimension) {
+        throw std::invalid_argument("Vector dimension mismatch.");
+    }
+    return vec.data();
+}
+
 PYBIND11_MODULE(vector_database_bindings, m) {
     m.doc() = "pybind11 example plugin"; // optional module docstring
 
@@ -51,16 +62,38 @@ PYBIND11_MODULE(vector_database_bindings, m) {
         .def("get_original_dim", &ScalarQuantizer::get_original_dim);
 
     py::class_<Database>(m, "Database")
-        .def(py::init<const std::string&, size_t, int, int, int, DistanceMetric, bool, size_t, bool>(),
+        .def(py::init<const std::string&, size_t, int, int, int, DistanceMetric, bool, size_t, bool, bool>(),
              py::arg("db_path"), py::arg("vector_dimension"), py::arg("M") = 16,
              py::arg("efConstruction") = 200, py::arg("efSearch") = 50,
              py::arg("metric") = DistanceMetric::L2, py::arg("read_only") = false,
-             py::arg("cache_size_mb") = 0, py::arg("sq_enabled") = false)
-        .def("insert", &Database::insert, py::arg("vec"), py::arg("meta") = Metadata{})
+             py::arg("cache_size_mb") = 0, py::arg("sq_enabled") = false, py::arg("fp16_enabled") = false)
+        .def("insert", [](Database& db, const FloatArray& vec, const Metadata& meta) {
+                 return db.insert(vector_data(vec, db.get_vector_dimension()), meta);
+             }, py::arg("vec"), py::arg("meta") = Metadata{})
+        .def("insert", py::overload_cast<const std::vector<float>&, const Metadata&>(&Database::insert), py::arg("vec"), py::arg("meta") = Metadata{})
+        .def("bulk_insert", [](Database& db, py::array_t<float, py::array::c_style | py::array::forcecast> vecs, const std::vector<Metadata>& metas, bool defer_index) {
+                 if (vecs.ndim() != 2) {
+                     throw std::invalid_argument("Expected a 2-D array of shape (num_vectors, vector_dimension).");
+                 }
+                 if (static_cast<size_t>(vecs.shape(1)) != db.get_vector_dimension()) {
+                     throw std::invalid_argument("Vector dimension mismatch.");
+                 }
+                 return db.bulk_insert(vecs.data(), vecs.shape(0), metas, defer_index);
+             }, py::arg("vecs"), py::arg("metas") = std::vector<Metadata>{}, py::arg("defer_index") = false)
+        .def("build_index", &Database::build_index)
+        .def("num_pending", &Database::num_pending)
+        .def("num_deleted", &Database::num_deleted)
+        .def("get_vector_dimension", &Database::get_vector_dimension)
         .def("update_vector", &Database::update_vector, py::arg("id"), py::arg("new_vec"), py::arg("new_meta") = Metadata{})
         .def("delete_vector", &Database::delete_vector, py::arg("id"))
+        .def("query", [](Database& db, const FloatArray& query, int k, const FilterFunc& filter, const std::set<Include>& include) {
+                 const float* data = vector_data(query, db.get_vector_dimension());
+                 return db.query(std::vector<float>(data, data + query.shape(0)), k, filter, include);
+             }, py::arg("query"), py::arg("k"),
+             py::arg("filter") = nullptr, py::arg("include") = std::set<Include>{Include::ID})
         .def("query", &Database::query, py::arg("query"), py::arg("k"),
              py::arg("filter") = nullptr, py::arg("include") = std::set<Include>{Include::ID})
+        .def("get_all", &Database::get_all, py::arg("include") = std::set<Include>{Include::ID})
         .def("train_quantizer", &Database::train_quantizer)
         .def("rebuild_index", &Database::rebuild_index)
         .def("save", &Database::save, py::arg("sync_mode") = SyncMode::FULL)
@@ -16,10 +16,14 @@ enum class SyncMode {
     OFF
 };
 
+// Written at the start of every database file so stale or foreign files are rejected on load
+constexpr uint32_t kFileMagic = 0x57534E48; // "HNSW"
+constexpr uint32_t kFileVersion = 4; // 3: COSINE databases store unit-length vectors, 4: optional FP16 vector block
+
 class Database {
 public:
-    Database(const std::string& db_path, size_t vector_dimension, int M = 16, int efConstruction = 200, int efSearch = 50, DistanceMetric metric = DistanceMetric::L2, bool read_only = false, size_t cache_size_mb = 0, bool sq_enabled = false)
-        : db_path_(db_path), hnsw_(vector_dimension, M, efConstruction, efSearch, metric, nullptr), read_only_(read_only), cache_size_mb_(cache_size_mb) {
+    Database(const std::string& db_path, size_t vector_dimension, int M = 16, int efConstruction = 200, int efSearch = 50, DistanceMetric metric = DistanceMetric::L2, bool read_only = false, size_t cache_size_mb = 0, bool sq_enabled = false, bool fp16_enabled = false)
+        : db_path_(db_path), hnsw_(vector_dimension, M, efConstruction, efSearch, metric, nullptr, fp16_enabled), read_only_(read_only), cache_size_mb_(cache_size_mb) {
         if (sq_enabled) {
             sq_ = std::make_unique<sq::ScalarQuantizer>(vector_dimension);
             hnsw_.set_quantizer(sq_.get());
@@ -36,6 +40,71 @@ public:
         return hnsw_.insert(vec, meta);
     }
 
+    // Inserts get_vector_dimension() floats read from a raw buffer.
+    uint32_t insert(const float* vec_data, const Metadata& meta = {}) {
+        if (read_only_) {
+            throw std::runtime_error("Database is in read-only mode.");
+        }
+        uint32_t id = hnsw_.add_unindexed(vec_data, meta);
+        hnsw_.index_pending();
+        return id;
+    }
+
+    // Inserts num_vectors rows of a contiguous row-major float buffer. With defer_index the vectors are
+    // stored but not linked into the HNSW graph (and not searchable) until build_index() is called.
+    std::vector<uint32_t> bulk_insert(const float* data, size_t num_vectors, const std::vector<Metadata>& metas = {}, bool defer_index = false) {
+        if (read_only_) {
+            throw std::runtime_error("Database is in read-only mode.");
+        }
+        if (!metas.empty() && metas.size() != num_vectors) {
+            throw std::invalid_argument("Number of metadata entries does not match number of vectors.");
+        }
+        const size_t vector_dimension = get_vector_dimension();
+        std::vector<uint32_t> ids;
+        ids.reserve(num_vectors);
+        for (size_t i = 0; i < num_vectors; ++i) {
+            ids.push_back(hnsw_.add_unindexed(data + i * vector_dimension, metas.empty() ? Metadata{} : metas[i]));
+        }
+        if (!defer_index) {
+            build_index();
+        }
+        return ids;
+    }
+
+    std::vector<uint32_t> bulk_insert(const std::vector<std::vector<float>>& vecs, const std::vector<Metadata>& metas = {}, bool defer_index = false) {
+        const size_t vector_dimension = get_vector_dimension();
+        std::vector<float> data;
+        data.reserve(vecs.size() * vector_dimension);
+        for (const auto& vec : vecs) {
+            if (vec.size() != vector_dimension) {
+                throw std::invalid_argument("Vector dimension mismatch.");
+            }
+            data.insert(data.end(), vec.begin(), vec.end());
+        }
+        return bulk_insert(data.data(), vecs.size(), metas, defer_index);
+    }
+
+    // Links all vectors added with defer_index into the HNSW graph.
+    void build_index() {
+        if (read_only_) {
+            throw std::runtime_error("Database is in read-only mode.");
+        }
+        hnsw_.index_pending();
+    }
+
+    size_t num_pending() const {
+        return hnsw_.num_pending();
+    }
+
+    // Deleted vectors stay in storage (and in saved files) until rebuild_index(), which also renumbers the IDs.
+    size_t num_deleted() const {
+        return hnsw_.get_deleted_nodes().size();
+    }
+
+    size_t get_vector_dimension() const {
+        return hnsw_.get_vector_storage().get_vector_dimension();
+    }
+
     uint32_t update_vector(uint32_t id, const std::vector<float>& new_vec, const Metadata& new_meta = {}) {
         if (read_only_) {
             throw std::runtime_error("Database is in read-only mode.");
@@ -55,6 +124,28 @@ public:
         return hnsw_.k_nearest_neighbors(query, k, filter, include);
     }
 
+    // Every stored vector that has not been deleted, in ID order, e.g. to rebuild an application's view after load().
+    // Include::DISTANCE has no meaning here and is ignored.
+    std::vector<QueryResult> get_all(const std::set<Include>& include = {Include::ID}) const {
+        const auto& vector_storage = hnsw_.get_vector_storage();
+        const auto& deleted_nodes = hnsw_.get_deleted_nodes();
+        std::vector<QueryResult> results;
+        results.reserve(vector_storage.size() - deleted_nodes.size());
+        for (uint32_t id = 0; id < vector_storage.size(); ++id) {
+            if (deleted_nodes.count(id)) continue;
+            QueryResult result;
+            result.id = id;
+            if (include.count(Include::METADATA)) {
+                result.metadata = vector_storage.get_metadata(id);
+            }
+            if (include.count(Include::VECTOR)) {
+                result.vector = vector_storage.get_vector(id);
+            }
+            results.push_back(std::move(result));
+        }
+        return results;
+    }
+
     void train_quantizer() {
         if (!sq_) {
             return;
@@ -82,7 +173,8 @@ public:
             hnsw_.get_efConstruction(),
             hnsw_.get_efSearch(),
             hnsw_.get_distance_metric(),
-            sq_.get()
+            sq_.get(),
+            hnsw_.get_vector_storage().is_fp16()
         );
 
         const auto& vector_storage = hnsw_.get_vector_storage();
@@ -102,12 +194,16 @@ public:
             throw std::runtime_error("Database is in read-only mode.");
         }
         std::ofstream ofs(db_path_, std::ios::binary);
-        
+        ofs.write(reinterpret_cast<const char*>(&kFileMagic), sizeof(kFileMagic));
+        ofs.write(reinterpret_cast<const char*>(&kFileVersion), sizeof(kFileVersion));
+
         bool sq_enabled = (sq_ != nullptr);
         ofs.write(reinterpret_cast<const char*>(&sq_enabled), sizeof(sq_enabled));
         if (sq_enabled) {
             sq_->save(ofs);
         }
+        bool fp16_enabled = hnsw_.get_vector_storage().is_fp16();
+        ofs.write(reinterpret_cast<const char*>(&fp16_enabled), sizeof(fp16_enabled));
 
         int M = hnsw_.get_M();
         int efConstruction = hnsw_.get_efConstruction();
@@ -136,11 +232,14 @@ public:
         size_t vector_dimension = vector_storage.get_vector_dimension();
         ofs.write(reinterpret_cast<const char*>(&num_vectors), sizeof(num_vectors));
         ofs.write(reinterpret_cast<const char*>(&vector_dimension), sizeof(vector_dimension));
+        // Vectors go out as one flat float32 (or float16) [num_vectors][vector_dimension] block, followed by the metadata
+        if (fp16_enabled) {
+            ofs.write(reinterpret_cast<const char*>(vector_storage.get_half_data().data()), num_vectors * vector_dimension * sizeof(fp16::half));
+        } else {
+            ofs.write(reinterpret_cast<const char*>(vector_storage.get_data().data()), num_vectors * vector_dimension * sizeof(float));
+        }
         for (size_t i = 0; i < num_vectors; ++i) {
-            const auto& vec = vector_storage.get_vector(i);
             const auto& meta = vector_storage.get_metadata(i);
-            ofs.write(reinterpret_cast<const char*>(vec.data()), vector_dimension * sizeof(float));
-            
             size_t meta_size = meta.size();
             ofs.write(reinterpret_cast<const char*>(&meta_size), sizeof(meta_size));
             for (const auto& pair : meta) {
@@ -172,12 +271,21 @@ public:
             return;
         }
 
+        uint32_t magic = 0, version = 0;
+        ifs.read(reinterpret_cast<char*>(&magic), sizeof(magic));
+        ifs.read(reinterpret_cast<char*>(&version), sizeof(version));
+        if (magic != kFileMagic || version != kFileVersion) {
+            throw std::runtime_error("Unsupported database file format: " + db_path_);
+        }
+
         bool sq_enabled;
         ifs.read(reinterpret_cast<char*>(&sq_enabled), sizeof(sq_enabled));
         if (sq_enabled) {
             sq_ = std::make_unique<sq::ScalarQuantizer>(0);
             sq_->load(ifs);
         }
+        bool fp16_enabled;
+        ifs.read(reinterpret_cast<char*>(&fp16_enabled), sizeof(fp16_enabled));
 
         int M, efConstruction, efSearch;
         DistanceMetric metric;
@@ -209,11 +317,19 @@ public:
         ifs.read(reinterpret_cast<char*>(&num_vectors), sizeof(num_vectors));
         ifs.read(reinterpret_cast<char*>(&vector_dimension), sizeof(vector_dimension));
         
-        VectorStorage vector_storage(vector_dimension, sq_.get());
-        for (size_t i = 0; i < num_vectors; ++i) {
-            std::vector<float> vec(vector_dimension);
-            ifs.read(reinterpret_cast<char*>(vec.data()), vector_dimension * sizeof(float));
+        // The vector block is read straight into the storage buffer in a single call
+        std::vector<float> data;
+        std::vector<fp16::half> half_data;
+        if (fp16_enabled) {
+            half_data.resize(num_vectors * vector_dimension);
+            ifs.read(reinterpret_cast<char*>(half_data.data()), half_data.size() * sizeof(fp16::half));
+        } else {
+            data.resize(num_vectors * vector_dimension);
+            ifs.read(reinterpret_cast<char*>(data.data()), data.size() * sizeof(float));
+        }
 
+        std::vector<Metadata> metadata(num_vectors);
+        for (size_t i = 0; i < num_vectors; ++i) {
             size_t meta_size;
             ifs.read(reinterpret_cast<char*>(&meta_size), sizeof(meta_size));
             Metadata meta;
@@ -230,7 +346,17 @@ public:
                 ifs.read(&value[0], value_size);
                 meta[key] = value;
             }
-            vector_storage.add_vector(vec, meta);
+            metadata[i] = std::move(meta);
+        }
+        if (!ifs) {
+            throw std::runtime_error("Database file is truncated: " + db_path_);
+        }
+
+        VectorStorage vector_storage(vector_dimension, sq_.get(), fp16_enabled);
+        if (fp16_enabled) {
+            vector_storage.assign(std::move(half_data), std::move(metadata));
+        } else {
+            vector_storage.assign(std::move(data), std::move(metadata));
         }
         if (sq_enabled) {
             const_cast<VectorStorage&>(vector_storage).encode_all_vectors();
@@ -245,7 +371,7 @@ public:
             deleted_nodes.insert(deleted_id);
         }
 
-        hnsw_ = HNSW(vector_dimension, M, efConstruction, efSearch, metric, nodes, vector_storage, deleted_nodes, sq_.get());
+        hnsw_ = HNSW(vector_dimension, M, efConstruction, efSearch, metric, std::move(nodes), std::move(vector_storage), deleted_nodes, sq_.get());
     }
 
 private:
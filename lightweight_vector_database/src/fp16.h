@@ -0,0 +1,153 @@
+#ifndef FP16_H
+#define FP16_H
+
+#include <cstdint>
+#include <cstddef>
+#include <cstring>
+#include <vector>
+
+#if defined(__F16C__) && defined(__AVX2__) && defined(__FMA__)
+#include <immintrin.h>
+#endif
+
+namespace fp16 {
+
+// IEEE 754 half precision stored as its raw bit pattern.
+using half = uint16_t;
+
+// Round-to-nearest-even conversion, including subnormals, infinities and NaN.
+inline half from_float(float value) {
+    uint32_t f;
+    std::memcpy(&f, &value, sizeof(f));
+    const uint32_t sign = f & 0x80000000u;
+    f ^= sign;
+
+    half h;
+    if (f >= (127u + 16u) << 23) {
+        // Too large for half (or already Inf/NaN)
+        h = f > 0x7F800000u ? 0x7E00 : 0x7C00;
+    } else if (f < 113u << 23) {
+        // Result is subnormal or zero: let float addition do the rounding
+        const uint32_t denorm_magic_bits = ((127u - 15u) + (23u - 10u) + 1u) << 23;
+        float denorm_magic, x;
+        std::memcpy(&denorm_magic, &denorm_magic_bits, sizeof(denorm_magic));
+        std::memcpy(&x, &f, sizeof(x));
+        x += denorm_magic;
+        std::memcpy(&f, &x, sizeof(f));
+        h = static_cast<half>(f - denorm_magic_bits);
+    } else {
+        const uint32_t mantissa_odd = (f >> 13) & 1u;
+        f += (static_cast<uint32_t>(15 - 127) << 23) + 0xFFFu;
+        f += mantissa_odd;
+        h = static_cast<half>(f >> 13);
+    }
+    return h | static_cast<half>(sign >> 16);
+}
+
+inline float to_float(half h) {
+    const uint32_t shifted_exponent = 0x7C00u << 13;
+    uint32_t f = (h & 0x7FFFu) << 13;
+    const uint32_t exponent = f & shifted_exponent;
+    f += (127u - 15u) << 23;
+    if (exponent == shifted_exponent) {
+        // Inf/NaN
+        f += (128u - 16u) << 23;
+    } else if (exponent == 0) {
+        // Zero/subnormal: renormalize
+        const uint32_t magic_bits = 113u << 23;
+        float magic, x;
+        std::memcpy(&magic, &magic_bits, sizeof(magic));
+        f += 1u << 23;
+        std::memcpy(&x, &f, sizeof(x));
+        x -= magic;
+        std::memcpy(&f, &x, sizeof(f));
+    }
+    f |= static_cast<uint32_t>(h & 0x8000u) << 16;
+    float value;
+    std::memcpy(&value, &f, sizeof(value));
+    return value;
+}
+
+// Widening lookup for the scalar loops: 256 KB, built on first use. A load per element is several times
+// cheaper than the bit manipulation in to_float when the F16C kernels are not compiled in.
+inline const float* half_to_float_table() {
+    static const std::vector<float> table = [] {
+        std::vector<float> values(0x10000);
+        for (uint32_t bits = 0; bits <= 0xFFFF; ++bits) {
+            values[bits] = to_float(static_cast<half>(bits));
+        }
+        return values;
+    }();
+    return table.data();
+}
+
+inline void encode(const float* src, half* dst, size_t n) {
+    for (size_t i = 0; i < n; ++i) {
+        dst[i] = from_float(src[i]);
+    }
+}
+
+inline void decode(const half* src, float* dst, size_t n) {
+    size_t i = 0;
+#if defined(__F16C__) && defined(__AVX2__) && defined(__FMA__)
+    for (; i + 8 <= n; i += 8) {
+        _mm256_storeu_ps(dst + i, _mm256_cvtph_ps(_mm_loadu_si128(reinterpret_cast<const __m128i*>(src + i))));
+    }
+#endif
+    const float* table = half_to_float_table();
+    for (; i < n; ++i) {
+        dst[i] = table[src[i]];
+    }
+}
+
+#if defined(__F16C__) && defined(__AVX2__) && defined(__FMA__)
+inline float horizontal_sum(__m256 acc) {
+    __m128 lanes = _mm_add_ps(_mm256_castps256_ps128(acc), _mm256_extractf128_ps(acc, 1));
+    lanes = _mm_hadd_ps(lanes, lanes);
+    lanes = _mm_hadd_ps(lanes, lanes);
+    return _mm_cvtss_f32(lanes);
+}
+#endif
+
+// Distance kernels between a float query and a stored half vector; the half side is widened on the fly.
+inline float dot_product(const float* a, const half* b, size_t n) {
+    size_t i = 0;
+    float sum = 0.0f;
+#if defined(__F16C__) && defined(__AVX2__) && defined(__FMA__)
+    __m256 acc = _mm256_setzero_ps();
+    for (; i + 8 <= n; i += 8) {
+        __m256 wide = _mm256_cvtph_ps(_mm_loadu_si128(reinterpret_cast<const __m128i*>(b + i)));
+        acc = _mm256_fmadd_ps(_mm256_loadu_ps(a + i), wide, acc);
+    }
+    sum = horizontal_sum(acc);
+#endif
+    const float* table = half_to_float_table();
+    for (; i < n; ++i) {
+        sum += a[i] * table[b[i]];
+    }
+    return sum;
+}
+
+inline float l2_distance(const float* a, const half* b, size_t n) {
+    size_t i = 0;
+    float sum = 0.0f;
+#if defined(__F16C__) && defined(__AVX2__) && defined(__FMA__)
+    __m256 acc = _mm256_setzero_ps();
+    for (; i + 8 <= n; i += 8) {
+        __m256 wide = _mm256_cvtph_ps(_mm_loadu_si128(reinterpret_cast<const __m128i*>(b + i)));
+        __m256 diff = _mm256_sub_ps(_mm256_loadu_ps(a + i), wide);
+        acc = _mm256_fmadd_ps(diff, diff, acc);
+    }
+    sum = horizontal_sum(acc);
+#endif
+    const float* table = half_to_float_table();
+    for (; i < n; ++i) {
+        float diff = a[i] - table[b[i]];
+        sum += diff * diff;
+    }
+    return sum;
+}
+
+} // namespace fp16
+
+#endif // FP16_H
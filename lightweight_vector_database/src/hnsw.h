@@ -14,6 +14,11 @@
 #include <functional>
 #include <unordered_set>
 #include "sq.h"
+#include "fp16.h"
+
+#if defined(__AVX2__) && defined(__FMA__)
+#include <immintrin.h>
+#endif
 
 namespace hnsw {
 
@@ -41,11 +46,31 @@ enum class Include {
 // Struct for search results
 struct QueryResult {
     int id;
-    float distance;
+    float distance = 0.0f;
     Metadata metadata;
     std::vector<float> vector;
 };
 
+// Dot product of two float arrays of length n. Uses 8-wide FMA when built with AVX2 (e.g. -march=native).
+inline float dot_product(const float* a, const float* b, size_t n) {
+    size_t i = 0;
+    float sum = 0.0f;
+#if defined(__AVX2__) && defined(__FMA__)
+    __m256 acc = _mm256_setzero_ps();
+    for (; i + 8 <= n; i += 8) {
+        acc = _mm256_fmadd_ps(_mm256_loadu_ps(a + i), _mm256_loadu_ps(b + i), acc);
+    }
+    __m128 lanes = _mm_add_ps(_mm256_castps256_ps128(acc), _mm256_extractf128_ps(acc, 1));
+    lanes = _mm_hadd_ps(lanes, lanes);
+    lanes = _mm_hadd_ps(lanes, lanes);
+    sum = _mm_cvtss_f32(lanes);
+#endif
+    for (; i < n; ++i) {
+        sum += a[i] * b[i];
+    }
+    return sum;
+}
+
 // Represents a node in the HNSW graph.
 struct Node {
     uint32_t id;
@@ -57,34 +82,97 @@ struct Node {
     }
 };
 
+// Keeps vectors as float32, or as IEEE half precision when fp16 is set (half the memory and file size).
 class VectorStorage {
 public:
-    VectorStorage(size_t vector_dimension, sq::ScalarQuantizer* sq = nullptr) 
-        : vector_dimension_(vector_dimension), sq_(sq) {}
+    VectorStorage(size_t vector_dimension, sq::ScalarQuantizer* sq = nullptr, bool fp16 = false) 
+        : vector_dimension_(vector_dimension), sq_(sq), fp16_(fp16) {}
 
     void add_vector(const std::vector<float>& vec, const Metadata& meta) {
         if (vec.size() != vector_dimension_) {
             throw std::invalid_argument("Vector dimension mismatch.");
         }
-        vectors_.push_back(vec);
+        add_vector(vec.data(), meta);
+    }
+
+    // Adds vector_dimension_ floats read from a raw buffer, e.g. one row of a numpy array.
+    void add_vector(const float* vec_data, const Metadata& meta) {
+        if (fp16_) {
+            half_data_.resize(half_data_.size() + vector_dimension_);
+            fp16::encode(vec_data, half_data_.data() + half_data_.size() - vector_dimension_, vector_dimension_);
+        } else {
+            data_.insert(data_.end(), vec_data, vec_data + vector_dimension_);
+        }
         metadata_.push_back(meta);
         if (sq_ && sq_->is_trained()) {
-            encoded_vectors_.push_back(sq_->encode(vec));
+            encoded_vectors_.push_back(sq_->encode(get_vector(metadata_.size() - 1)));
+        }
+    }
+
+    // Replaces the contents with a flat row-major block of vectors, e.g. as read from disk in one pass.
+    void assign(std::vector<float>&& data, std::vector<Metadata>&& metadata) {
+        if (fp16_) {
+            throw std::logic_error("FP16 storage must be assigned half precision data.");
+        }
+        if (data.size() != metadata.size() * vector_dimension_) {
+            throw std::invalid_argument("Vector data does not match the number of metadata entries.");
         }
+        data_ = std::move(data);
+        metadata_ = std::move(metadata);
+        encoded_vectors_.clear();
+    }
+
+    void assign(std::vector<fp16::half>&& half_data, std::vector<Metadata>&& metadata) {
+        if (!fp16_) {
+            throw std::logic_error("FP32 storage must be assigned float data.");
+        }
+        if (half_data.size() != metadata.size() * vector_dimension_) {
+            throw std::invalid_argument("Vector data does not match the number of metadata entries.");
+        }
+        half_data_ = std::move(half_data);
+        metadata_ = std::move(metadata);
+        encoded_vectors_.clear();
     }
 
     void encode_all_vectors() {
         if (!sq_ || !sq_->is_trained()) {
             return;
         }
-        encoded_vectors_.resize(vectors_.size());
-        for (size_t i = 0; i < vectors_.size(); ++i) {
-            encoded_vectors_[i] = sq_->encode(vectors_[i]);
+        encoded_vectors_.resize(size());
+        for (size_t i = 0; i < size(); ++i) {
+            encoded_vectors_[i] = sq_->encode(get_vector(i));
+        }
+    }
+
+    std::vector<float> get_vector(size_t index) const {
+        if (fp16_) {
+            std::vector<float> vec(vector_dimension_);
+            fp16::decode(get_half_vector_data(index), vec.data(), vector_dimension_);
+            return vec;
         }
+        const float* vec_data = get_vector_data(index);
+        return std::vector<float>(vec_data, vec_data + vector_dimension_);
     }
 
-    const std::vector<float>& get_vector(size_t index) const {
-        return vectors_[index];
+    // Vectors are stored back to back with a fixed stride of vector_dimension_ elements.
+    const float* get_vector_data(size_t index) const {
+        return data_.data() + index * vector_dimension_;
+    }
+
+    const fp16::half* get_half_vector_data(size_t index) const {
+        return half_data_.data() + index * vector_dimension_;
+    }
+
+    const std::vector<float>& get_data() const {
+        return data_;
+    }
+
+    const std::vector<fp16::half>& get_half_data() const {
+        return half_data_;
+    }
+
+    bool is_fp16() const {
+        return fp16_;
     }
 
     const std::vector<uint8_t>& get_encoded_vector(size_t index) const {
@@ -99,7 +187,7 @@ public:
     }
 
     size_t size() const {
-        return vectors_.size();
+        return metadata_.size();
     }
 
     size_t get_vector_dimension() const {
@@ -108,16 +196,18 @@ public:
 
 private:
     size_t vector_dimension_;
-    std::vector<std::vector<float>> vectors_;
+    std::vector<float> data_;
+    std::vector<fp16::half> half_data_;
     std::vector<Metadata> metadata_;
     sq::ScalarQuantizer* sq_ = nullptr;
+    bool fp16_ = false;
     std::vector<std::vector<uint8_t>> encoded_vectors_;
 };
 
 class HNSW {
 public:
-    HNSW(size_t vector_dimension, int M = 5, int efConstruction = 10, int efSearch = 10, DistanceMetric metric = DistanceMetric::L2, sq::ScalarQuantizer* sq = nullptr)
-        : vector_storage(vector_dimension, sq),
+    HNSW(size_t vector_dimension, int M = 5, int efConstruction = 10, int efSearch = 10, DistanceMetric metric = DistanceMetric::L2, sq::ScalarQuantizer* sq = nullptr, bool fp16 = false)
+        : vector_storage(vector_dimension, sq, fp16),
           entry_point_id(-1),
           M(M),
           efConstruction(efConstruction),
@@ -129,11 +219,11 @@ public:
         m_L = 1.0 / log(1.0 * M);
     }
 
-    HNSW(size_t vector_dimension, int M, int efConstruction, int efSearch, DistanceMetric metric, const std::vector<Node>& nodes, const VectorStorage& vector_storage, const std::unordered_set<uint32_t>& deleted_nodes, sq::ScalarQuantizer* sq = nullptr)
-        : vector_storage(vector_storage),
-          nodes(nodes),
+    HNSW(size_t vector_dimension, int M, int efConstruction, int efSearch, DistanceMetric metric, std::vector<Node> nodes, VectorStorage vector_storage, const std::unordered_set<uint32_t>& deleted_nodes, sq::ScalarQuantizer* sq = nullptr)
+        : vector_storage(std::move(vector_storage)),
+          nodes(std::move(nodes)),
           deleted_nodes_(deleted_nodes),
-          entry_point_id(nodes.empty() ? -1 : nodes.back().id),
+          entry_point_id(-1),
           M(M),
           efConstruction(efConstruction),
           efSearch(efSearch),
@@ -142,156 +232,164 @@ public:
           gen(std::random_device{}()),
           dist(0.0, 1.0) {
         m_L = 1.0 / log(1.0 * M);
+        // The entry point isn't persisted; the last node may be deleted and need not be on the top layer
+        entry_point_id = find_entry_point();
     }
 
     template<typename T>
     void set_quantizer(T* quantizer) {
         if constexpr (std::is_same_v<T, sq::ScalarQuantizer>) {
             sq_ = quantizer;
-            vector_storage = VectorStorage(vector_storage.get_vector_dimension(), sq_);
+            vector_storage = VectorStorage(vector_storage.get_vector_dimension(), sq_, vector_storage.is_fp16());
         }
     }
     
+    using Candidate = std::pair<float, int>;
+
+    // Returns the IDs found by search_layer_candidates, closest first.
     std::vector<int> search_layer(const std::vector<float>& query, int entry_point_id, int ef, int layer_level, const FilterFunc& filter = nullptr) {
-        using Candidate = std::pair<float, int>;
+        std::vector<Candidate> candidates = search_layer_candidates(query, entry_point_id, ef, layer_level, filter);
+        std::sort(candidates.begin(), candidates.end());
+        std::vector<int> final_results;
+        final_results.reserve(candidates.size());
+        for (const Candidate& candidate : candidates) {
+            final_results.push_back(candidate.second);
+        }
+        return final_results;
+    }
+
+    // Beam search over one layer. Returns up to ef (distance, id) pairs of non-deleted nodes in no particular
+    // order, so callers that only need the closest few can select them without sorting the whole pool.
+    std::vector<Candidate> search_layer_candidates(const std::vector<float>& query, int entry_point_id, int ef, int layer_level, const FilterFunc& filter = nullptr) {
         std::priority_queue<Candidate, std::vector<Candidate>, std::greater<Candidate>> candidate_queue;
-        std::priority_queue<Candidate> result_queue;
-        std::set<int> visited_nodes;
+        // Max-heap on distance, kept in a plain vector so it can be returned without popping
+        std::vector<Candidate> result_queue;
+
+        // Visited marks are tagged with a per-search epoch, so they never need clearing between searches. The
+        // buffer is per thread (shared by all graphs on it; every search takes a fresh epoch), so concurrent
+        // read-only queries don't share any state.
+        thread_local std::vector<uint32_t> visited_epochs;
+        thread_local uint32_t visited_epoch = 0;
+        if (visited_epochs.size() < nodes.size()) {
+            visited_epochs.resize(nodes.size(), 0);
+        }
+        if (++visited_epoch == 0) {
+            std::fill(visited_epochs.begin(), visited_epochs.end(), 0);
+            visited_epoch = 1;
+        }
 
         float dist_to_entry = calculate_distance(query, entry_point_id);
         if (deleted_nodes_.find(entry_point_id) == deleted_nodes_.end()) {
             candidate_queue.push({dist_to_entry, entry_point_id});
             if (!filter || filter(vector_storage.get_metadata(entry_point_id))) {
-                result_queue.push({dist_to_entry, entry_point_id});
+                result_queue.push_back({dist_to_entry, entry_point_id});
             }
         }
-        visited_nodes.insert(entry_point_id);
+        visited_epochs[entry_point_id] = visited_epoch;
 
         while (!candidate_queue.empty()) {
             Candidate current = candidate_queue.top();
             candidate_queue.pop();
 
-            if (result_queue.size() == ef && current.first > result_queue.top().first) {
+            if (result_queue.size() == ef && current.first > result_queue.front().first) {
                 break;
             }
 
             for (int neighbor_id : nodes[current.second].neighbors[layer_level]) {
-                if (visited_nodes.find(neighbor_id) == visited_nodes.end()) {
-                    visited_nodes.insert(neighbor_id);
+                if (visited_epochs[neighbor_id] != visited_epoch) {
+                    visited_epochs[neighbor_id] = visited_epoch;
 
                     if (deleted_nodes_.find(neighbor_id) != deleted_nodes_.end()) {
                         continue;
                     }
 
                     float dist_to_neighbor = calculate_distance(query, neighbor_id);
-                    if (result_queue.size() < ef || dist_to_neighbor < result_queue.top().first) {
+                    if (result_queue.size() < ef || dist_to_neighbor < result_queue.front().first) {
                         candidate_queue.push({dist_to_neighbor, neighbor_id});
                         if (!filter || filter(vector_storage.get_metadata(neighbor_id))) {
-                            result_queue.push({dist_to_neighbor, neighbor_id});
+                            result_queue.push_back({dist_to_neighbor, neighbor_id});
+                            std::push_heap(result_queue.begin(), result_queue.end());
                         }
 
                         while (result_queue.size() > ef) {
-                            result_queue.pop();
+                            std::pop_heap(result_queue.begin(), result_queue.end());
+                            result_queue.pop_back();
                         }
                     }
                 }
             }
         }
-
-        std::vector<int> final_results;
-        while (!result_queue.empty()) {
-            final_results.push_back(result_queue.top().second);
-            result_queue.pop();
-        }
-        std::reverse(final_results.begin(), final_results.end());
-        return final_results;
+        return result_queue;
     }
 
     uint32_t insert(const std::vector<float>& vec, const Metadata& meta = {}) {
-        uint32_t new_node_id = vector_storage.size();
-        vector_storage.add_vector(vec, meta);
-
-        int new_node_layer = random_level();
-        nodes.emplace_back(new_node_id, new_node_layer);
-
-        if (entry_point_id == -1) {
-            entry_point_id = new_node_id;
-            return new_node_id;
-        }
-
-        int current_node_id = entry_point_id;
-        int current_max_layer = nodes[current_node_id].max_layer;
+        uint32_t new_node_id = add_unindexed(vec, meta);
+        index_pending();
+        return new_node_id;
+    }
 
-        for (int layer = current_max_layer; layer > new_node_layer; --layer) {
-            std::vector<int> candidates = search_layer(vec, current_node_id, 1, layer);
-            if (candidates.empty()) break;
-            current_node_id = candidates[0];
+    // Stores a vector without linking it into the graph; it is not searchable until index_pending() runs.
+    uint32_t add_unindexed(const std::vector<float>& vec, const Metadata& meta = {}) {
+        if (vec.size() != vector_storage.get_vector_dimension()) {
+            throw std::invalid_argument("Vector dimension mismatch.");
         }
+        return add_unindexed(vec.data(), meta);
+    }
 
-        for (int layer = std::min(new_node_layer, current_max_layer); layer >= 0; --layer) {
-            std::vector<int> neighbors_found = search_layer(vec, current_node_id, efConstruction, layer);
-            if (neighbors_found.empty()) continue;
-
-            std::vector<int> new_node_neighbors;
-            for (int neighbor_id : neighbors_found) {
-                if (new_node_neighbors.size() < M) {
-                    new_node_neighbors.push_back(neighbor_id);
-                } else break;
-            }
-
-            for (int neighbor_id : new_node_neighbors) {
-                nodes[new_node_id].neighbors[layer].push_back(neighbor_id);
-                nodes[neighbor_id].neighbors[layer].push_back(new_node_id);
-
-                if (nodes[neighbor_id].neighbors[layer].size() > M) {
-                    float max_dist = -1.0f;
-                    int furthest_neighbor_idx = -1;
-                    for (size_t i = 0; i < nodes[neighbor_id].neighbors[layer].size(); ++i) {
-                        int current_connected_neighbor_id = nodes[neighbor_id].neighbors[layer][i];
-                        float dist = calculate_distance(vector_storage.get_vector(neighbor_id), current_connected_neighbor_id);
-                        if (dist > max_dist) {
-                            max_dist = dist;
-                            furthest_neighbor_idx = i;
-                        }
-                    }
-                    if (furthest_neighbor_idx != -1) {
-                        nodes[neighbor_id].neighbors[layer].erase(nodes[neighbor_id].neighbors[layer].begin() + furthest_neighbor_idx);
-                    }
-                }
-            }
-            current_node_id = neighbors_found[0];
+    uint32_t add_unindexed(const float* vec_data, const Metadata& meta = {}) {
+        uint32_t new_node_id = vector_storage.size();
+        if (distance_metric == DistanceMetric::COSINE) {
+            // Cosine vectors are stored at unit length, so every distance is a single dot product
+            vector_storage.add_vector(normalized(vec_data).data(), meta);
+        } else {
+            vector_storage.add_vector(vec_data, meta);
         }
+        return new_node_id;
+    }
 
-        if (new_node_layer > nodes[entry_point_id].max_layer) {
-            entry_point_id = new_node_id;
+    // Links every stored vector that is not part of the graph yet, in ID order.
+    void index_pending() {
+        for (size_t id = nodes.size(); id < vector_storage.size(); ++id) {
+            link_node(id);
         }
-        return new_node_id;
     }
 
     std::vector<QueryResult> k_nearest_neighbors(const std::vector<float>& query, int k, const FilterFunc& filter = nullptr, const std::set<Include>& include = {Include::ID}) {
+        if (query.size() != vector_storage.get_vector_dimension()) {
+            throw std::invalid_argument("Vector dimension mismatch.");
+        }
         if (entry_point_id == -1) return {};
 
+        // Normalize the query once instead of dividing by its norm for every candidate
+        std::vector<float> normalized_query;
+        if (distance_metric == DistanceMetric::COSINE) {
+            normalized_query = normalized(query.data());
+        }
+        const std::vector<float>& search_query = normalized_query.empty() ? query : normalized_query;
+
         int current_node_id = entry_point_id;
         int current_max_layer = nodes[current_node_id].max_layer;
 
         for (int layer = current_max_layer; layer > 0; --layer) {
-            std::vector<int> candidates = search_layer(query, current_node_id, 1, layer, filter);
+            std::vector<int> candidates = search_layer(search_query, current_node_id, 1, layer, filter);
             if (!candidates.empty()) {
                 current_node_id = candidates[0];
             }
         }
 
-        std::vector<int> results_ids = search_layer(query, current_node_id, std::max(k, efSearch), 0, filter);
+        // The pool already excludes deleted nodes and carries each candidate's distance, so only the top k are ordered
+        std::vector<Candidate> candidates = search_layer_candidates(search_query, current_node_id, std::max(k, efSearch), 0, filter);
+        size_t num_results = std::min(static_cast<size_t>(std::max(k, 0)), candidates.size());
+        sort_closest(candidates, num_results);
 
         std::vector<QueryResult> final_results;
-        for (int id : results_ids) {
-            if (deleted_nodes_.count(id)) continue;
-            if (final_results.size() >= k) break;
-            
+        final_results.reserve(num_results);
+        for (size_t i = 0; i < num_results; ++i) {
+            int id = candidates[i].second;
             QueryResult result;
             result.id = id;
             if (include.count(Include::DISTANCE)) {
-                result.distance = calculate_distance(query, id);
+                result.distance = candidates[i].first;
             }
             if (include.count(Include::METADATA)) {
                 result.metadata = vector_storage.get_metadata(id);
@@ -305,6 +403,7 @@ public:
     }
 
     size_t size() const { return nodes.size(); }
+    size_t num_pending() const { return vector_storage.size() - nodes.size(); }
     const std::vector<Node>& get_nodes() const { return nodes; }
     int get_entry_point() const { return entry_point_id; }
     int get_M() const { return M; }
@@ -317,17 +416,7 @@ public:
     void mark_deleted(uint32_t id) {
         deleted_nodes_.insert(id);
         if (entry_point_id == id) {
-            int new_entry_point = -1;
-            int max_layer = -1;
-            for (const auto& node : nodes) {
-                if (!deleted_nodes_.count(node.id)) {
-                    if (node.max_layer > max_layer) {
-                        max_layer = node.max_layer;
-                        new_entry_point = node.id;
-                    }
-                }
-            }
-            entry_point_id = new_entry_point;
+            entry_point_id = find_entry_point();
         }
     }
 
@@ -345,11 +434,106 @@ private:
     std::uniform_real_distribution<> dist;
     std::unordered_set<uint32_t> deleted_nodes_;
 
+    std::vector<float> normalized(const float* vec_data) const {
+        const size_t n = vector_storage.get_vector_dimension();
+        std::vector<float> unit(vec_data, vec_data + n);
+        float norm = std::sqrt(dot_product(vec_data, vec_data, n));
+        // Zero vectors stay zero and end up at distance 1 from everything
+        if (norm > 0.0f) {
+            for (float& x : unit) x /= norm;
+        }
+        return unit;
+    }
+
+    // Moves the n closest candidates to the front in ascending order in O(N + n log n); the rest stay unordered.
+    static void sort_closest(std::vector<Candidate>& candidates, size_t n) {
+        n = std::min(n, candidates.size());
+        if (n < candidates.size()) {
+            std::nth_element(candidates.begin(), candidates.begin() + n, candidates.end());
+        }
+        std::sort(candidates.begin(), candidates.begin() + n);
+    }
+
+    // The non-deleted node on the highest layer, or -1 if there is none.
+    int find_entry_point() const {
+        int new_entry_point = -1;
+        int max_layer = -1;
+        for (const auto& node : nodes) {
+            if (!deleted_nodes_.count(node.id)) {
+                if (node.max_layer > max_layer) {
+                    max_layer = node.max_layer;
+                    new_entry_point = node.id;
+                }
+            }
+        }
+        return new_entry_point;
+    }
+
     int random_level() {
         return static_cast<int>(floor(-log(dist(gen)) * m_L));
     }
 
-    float calculate_distance(const std::vector<float>& a, const std::vector<float>& b) const {
+    // Links the stored vector new_node_id into the graph. Must be called in ID order.
+    void link_node(uint32_t new_node_id) {
+        const std::vector<float> vec = vector_storage.get_vector(new_node_id);
+        int new_node_layer = random_level();
+        nodes.emplace_back(new_node_id, new_node_layer);
+
+        if (entry_point_id == -1) {
+            entry_point_id = new_node_id;
+            return;
+        }
+
+        int current_node_id = entry_point_id;
+        int current_max_layer = nodes[current_node_id].max_layer;
+
+        for (int layer = current_max_layer; layer > new_node_layer; --layer) {
+            std::vector<int> candidates = search_layer(vec, current_node_id, 1, layer);
+            if (candidates.empty()) break;
+            current_node_id = candidates[0];
+        }
+
+        for (int layer = std::min(new_node_layer, current_max_layer); layer >= 0; --layer) {
+            std::vector<Candidate> neighbors_found = search_layer_candidates(vec, current_node_id, efConstruction, layer);
+            if (neighbors_found.empty()) continue;
+
+            // Only the M closest of the efConstruction candidates become neighbors
+            sort_closest(neighbors_found, M);
+            std::vector<int> new_node_neighbors;
+            for (size_t i = 0; i < neighbors_found.size() && new_node_neighbors.size() < M; ++i) {
+                new_node_neighbors.push_back(neighbors_found[i].second);
+            }
+
+            for (int neighbor_id : new_node_neighbors) {
+                nodes[new_node_id].neighbors[layer].push_back(neighbor_id);
+                nodes[neighbor_id].neighbors[layer].push_back(new_node_id);
+
+                if (nodes[neighbor_id].neighbors[layer].size() > M) {
+                    const std::vector<float> neighbor_vec = vector_storage.get_vector(neighbor_id);
+                    float max_dist = -1.0f;
+                    int furthest_neighbor_idx = -1;
+                    for (size_t i = 0; i < nodes[neighbor_id].neighbors[layer].size(); ++i) {
+                        int current_connected_neighbor_id = nodes[neighbor_id].neighbors[layer][i];
+                        float dist = calculate_distance(neighbor_vec, current_connected_neighbor_id);
+                        if (dist > max_dist) {
+                            max_dist = dist;
+                            furthest_neighbor_idx = i;
+                        }
+                    }
+                    if (furthest_neighbor_idx != -1) {
+                        nodes[neighbor_id].neighbors[layer].erase(nodes[neighbor_id].neighbors[layer].begin() + furthest_neighbor_idx);
+                    }
+                }
+            }
+            current_node_id = neighbors_found[0].second;
+        }
+
+        if (new_node_layer > nodes[entry_point_id].max_layer) {
+            entry_point_id = new_node_id;
+        }
+    }
+
+    float calculate_distance(const float* a, const float* b) const {
         switch (distance_metric) {
             case DistanceMetric::L2: return calculate_l2_distance(a, b);
             case DistanceMetric::COSINE: return calculate_cosine_distance(a, b);
@@ -362,28 +546,40 @@ private:
         if (sq_ && sq_->is_trained()) {
             return sq_->calculate_distance(query, vector_storage.get_encoded_vector(node_id));
         }
-        return calculate_distance(query, vector_storage.get_vector(node_id));
+        if (vector_storage.is_fp16()) {
+            return calculate_distance(query.data(), vector_storage.get_half_vector_data(node_id));
+        }
+        return calculate_distance(query.data(), vector_storage.get_vector_data(node_id));
+    }
+
+    // Stored FP16 vectors are widened inside the kernels; cosine vectors are unit length as in the float path
+    float calculate_distance(const float* a, const fp16::half* b) const {
+        const size_t n = vector_storage.get_vector_dimension();
+        switch (distance_metric) {
+            case DistanceMetric::L2: return fp16::l2_distance(a, b, n);
+            case DistanceMetric::COSINE: return 1.0f - fp16::dot_product(a, b, n);
+            case DistanceMetric::IP: return -fp16::dot_product(a, b, n);
+            default: throw std::runtime_error("Unknown distance metric.");
+        }
     }
 
-    float calculate_l2_distance(const std::vector<float>& a, const std::vector<float>& b) const {
+    float calculate_l2_distance(const float* a, const float* b) const {
+        const size_t n = vector_storage.get_vector_dimension();
         float distance = 0.0f;
-        for (size_t i = 0; i < a.size(); ++i) {
+        for (size_t i = 0; i < n; ++i) {
             float diff = a[i] - b[i];
             distance += diff * diff;
         }
         return distance;
     }
 
-    float calculate_cosine_distance(const std::vector<float>& a, const std::vector<float>& b) const {
-        float dot_product = std::inner_product(a.begin(), a.end(), b.begin(), 0.0f);
-        float norm_a = std::sqrt(std::inner_product(a.begin(), a.end(), a.begin(), 0.0f));
-        float norm_b = std::sqrt(std::inner_product(b.begin(), b.end(), b.begin(), 0.0f));
-        if (norm_a == 0.0f || norm_b == 0.0f) return 1.0f;
-        return 1.0f - (dot_product / (norm_a * norm_b));
+    // Both sides are unit length (see add_unindexed and k_nearest_neighbors)
+    float calculate_cosine_distance(const float* a, const float* b) const {
+        return 1.0f - dot_product(a, b, vector_storage.get_vector_dimension());
     }
 
-    float calculate_inner_product_distance(const std::vector<float>& a, const std::vector<float>& b) const {
-        return -std::inner_product(a.begin(), a.end(), b.begin(), 0.0f);
+    float calculate_inner_product_distance(const float* a, const float* b) const {
+        return -dot_product(a, b, vector_storage.get_vector_dimension());
     }
 };
 
@@ -2,6 +2,8 @@
 #include <iostream>
 #include <vector>
 #include <cassert>
+#include <random>
+#include <thread>
 #include <cmath> // For std::abs
 #include <stdexcept> // For std::invalid_argument
 
@@ -50,6 +52,29 @@ void test_cosine_distance_hnsw() {
     std::cout << "test_cosine_distance_hnsw passed." << std::endl;
 }
 
+void test_cosine_vectors_normalized_once() {
+    hnsw::HNSW hnsw_graph(2, 2, 5, 5, hnsw::DistanceMetric::COSINE); // vector_dimension = 2
+
+    hnsw_graph.insert({3.0f, 4.0f}, {}); // Node 0, stored as (0.6, 0.8)
+    hnsw_graph.insert({-2.0f, 0.0f}, {});// Node 1, stored as (-1, 0)
+
+    // Same direction at a different scale is at distance 0
+    std::vector<hnsw::QueryResult> results = hnsw_graph.k_nearest_neighbors({6.0f, 8.0f}, 2, nullptr, {hnsw::Include::ID, hnsw::Include::DISTANCE, hnsw::Include::VECTOR});
+    assert(results.size() == 2);
+    assert(results[0].id == 0);
+    assert(float_equals(results[0].distance, 0.0f));
+    assert(float_equals(results[0].vector[0], 0.6f) && float_equals(results[0].vector[1], 0.8f));
+    assert(results[1].id == 1);
+    assert(float_equals(results[1].distance, 1.6f));
+
+    // A zero query is at distance 1 from everything
+    results = hnsw_graph.k_nearest_neighbors({0.0f, 0.0f}, 1, nullptr, {hnsw::Include::ID, hnsw::Include::DISTANCE});
+    assert(results.size() == 1);
+    assert(float_equals(results[0].distance, 1.0f));
+
+    std::cout << "test_cosine_vectors_normalized_once passed." << std::endl;
+}
+
 void test_inner_product_distance_hnsw() {
     hnsw::HNSW hnsw_graph(2, 2, 5, 5, hnsw::DistanceMetric::IP); // vector_dimension = 2
 
@@ -342,9 +367,134 @@ void test_database_save_load() {
     std::cout << "test_database_save_load passed." << std::endl;
 }
 
+void test_database_get_all() {
+    std::string db_path = "get_all_test_db.bin";
+    {
+        hnsw::Database db(db_path, 2);
+        db.insert({1.0f, 2.0f}, {{"path", "a.jpg"}});
+        db.insert({3.0f, 4.0f}, {{"path", "b.jpg"}});
+        db.insert({5.0f, 6.0f}, {{"path", "c.jpg"}});
+        db.delete_vector(1);
+        db.save();
+    }
+
+    hnsw::Database db(db_path, 2);
+    db.load();
+    std::vector<hnsw::QueryResult> all = db.get_all({hnsw::Include::ID, hnsw::Include::METADATA});
+    assert(all.size() == 2);
+    assert(all[0].id == 0 && all[0].metadata["path"] == "a.jpg");
+    assert(all[1].id == 2 && all[1].metadata["path"] == "c.jpg");
+    assert(all[0].vector.empty());
+
+    all = db.get_all({hnsw::Include::ID, hnsw::Include::VECTOR});
+    assert(all[1].metadata.empty());
+    assert(all[1].vector == std::vector<float>({5.0f, 6.0f}));
+
+    std::remove(db_path.c_str());
+    std::cout << "test_database_get_all passed." << std::endl;
+}
+
+void test_bulk_insert_deferred_index() {
+    hnsw::Database db("bulk_test_db.bin", 2);
+
+    std::vector<std::vector<float>> vecs = {{0.0f, 0.0f}, {1.0f, 1.0f}, {10.0f, 10.0f}};
+    std::vector<hnsw::Metadata> metas = {{{"name", "a"}}, {{"name", "b"}}, {{"name", "c"}}};
+    std::vector<uint32_t> ids = db.bulk_insert(vecs, metas, true);
+    assert(ids.size() == 3);
+    assert(ids[0] == 0 && ids[1] == 1 && ids[2] == 2);
+
+    // Deferred vectors are stored but not searchable until the index is built
+    assert(db.num_pending() == 3);
+    assert(db.query({0.1f, 0.1f}, 1).empty());
+
+    db.build_index();
+    assert(db.num_pending() == 0);
+    std::vector<hnsw::QueryResult> results = db.query({9.0f, 9.0f}, 1, nullptr, {hnsw::Include::ID, hnsw::Include::METADATA});
+    assert(results.size() == 1);
+    assert(results[0].id == 2);
+    assert(results[0].metadata["name"] == "c");
+
+    // A regular insert links any pending vectors as well
+    db.bulk_insert({{5.0f, 5.0f}}, {}, true);
+    uint32_t id = db.insert({6.0f, 6.0f});
+    assert(id == 4);
+    assert(db.num_pending() == 0);
+    assert(db.query({5.0f, 5.0f}, 5).size() == 5);
+
+    // Metadata must line up with the vectors
+    bool caught_exception = false;
+    try {
+        db.bulk_insert(vecs, {{{"name", "a"}}});
+    } catch (const std::invalid_argument&) {
+        caught_exception = true;
+    }
+    assert(caught_exception);
+
+    std::cout << "test_bulk_insert_deferred_index passed." << std::endl;
+}
+
+void test_database_rejects_unknown_format() {
+    std::string db_path = "bad_format_db.bin";
+    {
+        std::ofstream ofs(db_path, std::ios::binary);
+        ofs << "not a database file";
+    }
+
+    bool caught_exception = false;
+    try {
+        hnsw::Database db(db_path, 2, 16, 200, 50, hnsw::DistanceMetric::L2, true); // Read only
+    } catch (const std::runtime_error&) {
+        caught_exception = true;
+    }
+    assert(caught_exception);
+    std::remove(db_path.c_str());
+    std::cout << "test_database_rejects_unknown_format passed." << std::endl;
+}
+
+void test_concurrent_queries() {
+    const size_t dim = 16;
+    hnsw::HNSW hnsw_graph(dim, 16, 100, 50);
+    std::mt19937 gen(7);
+    std::uniform_real_distribution<float> dist(-1.0f, 1.0f);
+    std::vector<std::vector<float>> queries;
+    for (int i = 0; i < 2000; ++i) {
+        std::vector<float> vec(dim);
+        for (float& x : vec) x = dist(gen);
+        hnsw_graph.insert(vec);
+        if (i % 10 == 0) queries.push_back(vec);
+    }
+
+    std::vector<std::vector<int>> expected;
+    for (const auto& query : queries) {
+        std::vector<int> ids;
+        for (const auto& result : hnsw_graph.k_nearest_neighbors(query, 10)) ids.push_back(result.id);
+        expected.push_back(ids);
+    }
+
+    // Read-only queries from several threads must give the same results as serial ones
+    std::vector<int> mismatches(4, 0);
+    std::vector<std::thread> threads;
+    for (int t = 0; t < 4; ++t) {
+        threads.emplace_back([&, t]() {
+            for (int round = 0; round < 5; ++round) {
+                for (size_t i = 0; i < queries.size(); ++i) {
+                    std::vector<int> ids;
+                    for (const auto& result : hnsw_graph.k_nearest_neighbors(queries[i], 10)) ids.push_back(result.id);
+                    if (ids != expected[i]) ++mismatches[t];
+                }
+            }
+        });
+    }
+    for (auto& thread : threads) thread.join();
+    for (int count : mismatches) assert(count == 0);
+
+    std::cout << "test_concurrent_queries passed." << std::endl;
+}
+
 int main() {
     test_l2_distance_hnsw();
     test_cosine_distance_hnsw();
+    test_cosine_vectors_normalized_once();
     test_inner_product_distance_hnsw();
     test_node_structure();
     test_vector_storage();
@@ -355,6 +505,10 @@ int main() {
     test_metadata_filtering();
     test_data_inclusion();
     test_database_save_load();
+    test_database_rejects_unknown_format();
+    test_database_get_all();
+    test_bulk_insert_deferred_index();
+    test_concurrent_queries();
 
     std::cout << "All tests passed!" << std::endl;
 
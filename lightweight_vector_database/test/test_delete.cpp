@@ -53,6 +53,7 @@ void test_rebuild_index() {
 
     // Delete node 1
     db.delete_vector(1);
+    assert(db.num_deleted() == 1);
 
     // 1. Before rebuild, query works as expected
     std::vector<hnsw::QueryResult> results_before_rebuild = db.query({1.1f, 1.1f}, 3);
@@ -62,6 +63,7 @@ void test_rebuild_index() {
 
     // 2. Rebuild the index
     db.rebuild_index();
+    assert(db.num_deleted() == 0);
     std::cout << "Step 2 passed: Index rebuilt." << std::endl;
 
     // 3. After rebuild, query should still be correct and IDs should be compacted
@@ -106,11 +108,45 @@ void test_persistence_with_deletes() {
     std::cout << "test_persistence_with_deletes passed." << std::endl;
 }
 
+void test_load_with_deleted_last_node() {
+    std::cout << "--- Running test_load_with_deleted_last_node ---" << std::endl;
+    std::string db_path = "deleted_last_node_test.bin";
+
+    // 1. Delete the most recently inserted vector before saving
+    {
+        hnsw::Database db(db_path, 2);
+        db.insert({1.0f, 1.0f}); // ID 0
+        db.insert({2.0f, 2.0f}); // ID 1
+        db.insert({3.0f, 3.0f}); // ID 2
+        db.delete_vector(2);
+        db.save();
+    }
+
+    // 2. After loading, search must not start from the deleted node
+    {
+        hnsw::Database db(db_path, 2);
+        db.load();
+        std::vector<hnsw::QueryResult> results = db.query({2.9f, 2.9f}, 3);
+        assert(results.size() == 2);
+        assert(results_contain_id(results, 0));
+        assert(results_contain_id(results, 1));
+
+        // New vectors are linked from a live entry point as well
+        db.insert({3.0f, 3.0f}); // ID 3
+        results = db.query({2.9f, 2.9f}, 1);
+        assert(results.size() == 1 && results[0].id == 3);
+        std::cout << "Step 2 passed: Loaded DB searches from a live entry point." << std::endl;
+    }
+
+    std::remove(db_path.c_str());
+    std::cout << "test_load_with_deleted_last_node passed." << std::endl;
+}
 
 int main() {
     test_soft_delete();
     test_rebuild_index();
     test_persistence_with_deletes();
+    test_load_with_deleted_last_node();
 
     std::cout << "\nAll deletion tests passed!" << std::endl;
 
@@ -0,0 +1,98 @@
+#include "database.h"
+#include <iostream>
+#include <vector>
+#include <cassert>
+#include <cmath>
+#include <cstring>
+#include <random>
+
+void test_fp16_conversion() {
+    std::cout << "Running test_fp16_conversion..." << std::endl;
+
+    assert(fp16::from_float(1.0f) == 0x3C00);
+    assert(fp16::from_float(-2.0f) == 0xC000);
+    assert(fp16::from_float(65504.0f) == 0x7BFF);   // Largest finite half
+    assert(fp16::from_float(70000.0f) == 0x7C00);   // Overflows to +Inf
+    assert(fp16::from_float(5.96046448e-8f) == 0x0001); // Smallest subnormal
+    assert(fp16::from_float(1.0f + 1.0f / 4096.0f) == 0x3C00); // Halfway rounds to even
+    assert(std::isinf(fp16::to_float(0x7C00)));
+    assert(std::isnan(fp16::to_float(fp16::from_float(NAN))));
+
+    // Every non-NaN half survives a round trip through float exactly, and the lookup table matches to_float
+    const float* table = fp16::half_to_float_table();
+    for (uint32_t bits = 0; bits <= 0xFFFF; ++bits) {
+        fp16::half h = static_cast<fp16::half>(bits);
+        float f = fp16::to_float(h);
+        assert(std::memcmp(&table[bits], &f, sizeof(f)) == 0);
+        if (std::isnan(f)) continue;
+        assert(fp16::from_float(f) == h);
+    }
+
+    // Bulk decode (F16C when available) agrees with the scalar path
+    std::vector<float> values = {0.1f, -0.5f, 3.25f, 1e-6f, -1000.0f, 0.0f, 2.5f, 7.0f, 123.456f, -0.001f};
+    std::vector<fp16::half> encoded(values.size());
+    fp16::encode(values.data(), encoded.data(), values.size());
+    std::vector<float> decoded(values.size());
+    fp16::decode(encoded.data(), decoded.data(), values.size());
+    for (size_t i = 0; i < values.size(); ++i) {
+        assert(decoded[i] == fp16::to_float(encoded[i]));
+        assert(std::fabs(decoded[i] - values[i]) <= std::fabs(values[i]) * 1e-3f + 1e-7f);
+    }
+
+    std::cout << "test_fp16_conversion passed." << std::endl;
+}
+
+void test_fp16_database() {
+    std::cout << "Running test_fp16_database..." << std::endl;
+
+    const std::string fp32_path = "test_fp32_storage.db";
+    const std::string fp16_path = "test_fp16_storage.db";
+    const size_t vector_dimension = 20;
+
+    std::mt19937 gen(42);
+    std::uniform_real_distribution<float> dist(-1.0f, 1.0f);
+    std::vector<std::vector<float>> vectors(200, std::vector<float>(vector_dimension));
+    for (auto& vec : vectors) {
+        for (float& x : vec) x = dist(gen);
+    }
+
+    for (hnsw::DistanceMetric metric : {hnsw::DistanceMetric::L2, hnsw::DistanceMetric::COSINE}) {
+        hnsw::Database fp32_db(fp32_path, vector_dimension, 16, 200, 50, metric);
+        hnsw::Database fp16_db(fp16_path, vector_dimension, 16, 200, 50, metric, false, 0, false, true);
+        fp32_db.bulk_insert(vectors, {}, false);
+        fp16_db.bulk_insert(vectors, {}, false);
+
+        // Querying with a stored vector finds itself, with a distance close to the float32 one
+        for (size_t i = 0; i < vectors.size(); i += 37) {
+            auto expected = fp32_db.query(vectors[i], 1, nullptr, {hnsw::Include::ID, hnsw::Include::DISTANCE});
+            auto results = fp16_db.query(vectors[i], 1, nullptr, {hnsw::Include::ID, hnsw::Include::DISTANCE, hnsw::Include::VECTOR});
+            assert(results.size() == 1);
+            assert(results[0].id == static_cast<int>(i));
+            assert(std::fabs(results[0].distance - expected[0].distance) < 1e-3f);
+            assert(results[0].vector.size() == vector_dimension);
+        }
+
+        fp32_db.save();
+        fp16_db.save();
+        std::ifstream fp32_file(fp32_path, std::ios::binary | std::ios::ate);
+        std::ifstream fp16_file(fp16_path, std::ios::binary | std::ios::ate);
+        assert(fp16_file.tellg() < fp32_file.tellg());
+
+        // The storage precision is restored from the file
+        hnsw::Database loaded_db(fp16_path, vector_dimension, 16, 200, 50, metric, true);
+        assert(loaded_db.get_all({hnsw::Include::VECTOR})[5].vector == fp16_db.get_all({hnsw::Include::VECTOR})[5].vector);
+        auto results = loaded_db.query(vectors[100], 1);
+        assert(results.size() == 1 && results[0].id == 100);
+
+        remove(fp32_path.c_str());
+        remove(fp16_path.c_str());
+    }
+
+    std::cout << "test_fp16_database passed." << std::endl;
+}
+
+int main() {
+    test_fp16_conversion();
+    test_fp16_database();
+    return 0;
+}
@@ -1,10 +1,45 @@
 import onnxruntime as ort
 from PIL import Image
 import numpy as np
+import cv2
 import os
+import io
+import hashlib
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+
+# ONNX tensor element types the embedder can feed and read back
+ORT_DTYPES = {'tensor(uint8)': np.uint8, 'tensor(float)': np.float32, 'tensor(float16)': np.float16}
+
+if numba is not None:
+    # One streaming pass from the HWC uint8 crop to the normalized CHW tensor. nogil lets the preprocessing
+    # thread pool run it concurrently; out is supplied by the caller so no buffer is shared between threads.
+    @numba.njit(cache=True, nogil=True, fastmath=True)
+    def _lut_to_chw(img_hwc, lut, out_chw):
+        h, w, channels = img_hwc.shape
+        for c in range(channels):
+            for y in range(h):
+                for x in range(w):
+                    out_chw[c, y, x] = lut[c, img_hwc[y, x, c]]
+else:
+    _lut_to_chw = None
+
+def variant_path(model_path, precision):
+    # models/mobilenetv2-7.onnx -> models/mobilenetv2-7.int8.onnx (built by optimize_model.py)
+    return f"{os.path.splitext(model_path)[0]}.{precision}.onnx"
 
 class ImageEmbedder:
-    def __init__(self, model_path='models/mobilenetv2-7.onnx'):
+    def __init__(self, model_path='models/mobilenetv2-7.onnx', precision='fp32', cache_path='embed_cache.npz', intra_op_threads=None,
+                 warmup=True):
         # Check if the model file exists
         if not os.path.exists(model_path):
             # Fallback for running from script's directory
@@ -14,14 +49,72 @@ class ImageEmbedder:
                 raise FileNotFoundError(f"ONNX model not found at {model_path} or {model_path_fallback}. Please ensure the model file is in the correct directory.")
             model_path = model_path_fallback
 
-        # Load the ONNX model
-        self.session = ort.InferenceSession(model_path)
+        # Prefer the optimized variant if it has been generated next to the original model
+        if precision and os.path.exists(variant_path(model_path, precision)):
+            model_path = variant_path(model_path, precision)
+        self.model_path = model_path
+
+        # Load the ONNX model with full graph optimizations (constant folding, Conv+BN+ReLU fusion, ...)
+        so = ort.SessionOptions()
+        so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # One op at a time, each split over roughly the physical cores (cpu_count counts SMT siblings); oversubscribing
+        # the depthwise convs with hyperthreads or a second inter-op pool only adds contention
+        so.intra_op_num_threads = intra_op_threads or max(1, (os.cpu_count() or 1) // 2)
+        so.inter_op_num_threads = 1
+        so.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        # Idle workers sleep instead of spinning, so the GUI and the preprocessing threads keep their cores
+        so.add_session_config_entry("session.intra_op.allow_spinning", "0")
+        self.session = ort.InferenceSession(model_path, sess_options=so, providers=["CPUExecutionProvider"])
         self.input_name = self.session.get_inputs()[0].name
         self.output_name = self.session.get_outputs()[0].name
 
+        # MobileNetV2 from the model zoo has a dynamic batch axis; cap batches if an export pinned it
+        batch_dim = self.session.get_inputs()[0].shape[0]
+        self.max_batch_size = batch_dim if isinstance(batch_dim, int) else None
+
+        # Models built by optimize_model.py normalize inside the graph and take raw uint8 pixels
+        self.raw_pixel_input = self.session.get_inputs()[0].type == 'tensor(uint8)'
+
+        # Batches are copied into one preallocated input buffer and bound with IOBinding, so ORT reuses the
+        # same memory on every call instead of taking a freshly stacked array; grown if a larger batch arrives
+        self._io_binding = self.session.io_binding()
+        # FP16 models take the float32 tensors cast on the copy into the buffer
+        self._input_dtype = ORT_DTYPES[self.session.get_inputs()[0].type]
+        self._output_dtype = ORT_DTYPES[self.session.get_outputs()[0].type]
+        output_dims = self.session.get_outputs()[0].shape[1:]
+        self._output_dims = tuple(output_dims) if all(isinstance(d, int) for d in output_dims) else None
+        self._allocate_buffers(self.max_batch_size or 32)
+
         # Define image preprocessing parameters
-        self.mean = np.array([0.485, 0.456, 0.406])
-        self.std = np.array([0.229, 0.224, 0.225])
+        self.mean = np.array(IMAGENET_MEAN)
+        self.std = np.array(IMAGENET_STD)
+
+        # Inputs are uint8, so (x / 255 - mean) / std only takes 256 values per channel: precompute them
+        self._lut = np.empty((3, 256), dtype=np.float32)
+        for c in range(3):
+            self._lut[c] = (np.arange(256, dtype=np.float32) / 255.0 - self.mean[c]) / self.std[c]
+
+        # Embeddings keyed by SHA-256 of the image bytes + the model, so unchanged images are never re-embedded
+        with open(model_path, 'rb') as f:
+            self._model_id = hashlib.sha256(f.read()).hexdigest()[:16]
+        self._embed_cache_path = cache_path
+        self._embed_cache = self._load_cache()
+
+        # The first run of each batch shape pays for kernel selection and arena allocation; do that now on a
+        # background thread so it is off both the caller's startup path and the first query. Not a daemon: the
+        # interpreter must wait for it at exit, since tearing ORT down under a running session aborts the process.
+        self._warmup_thread = None
+        if warmup:
+            self._warmup_thread = threading.Thread(target=self._warm_up)
+            self._warmup_thread.start()
+
+    def _warm_up(self):
+        if _lut_to_chw is not None and not self.raw_pixel_input:
+            # Load or compile the kernel for the non-contiguous crop view that _preprocess passes it
+            _lut_to_chw(np.zeros((224, 256, 3), dtype=np.uint8)[:, 16:240], self._lut, np.empty((3, 224, 224), dtype=np.float32))
+        # Plain session.run with its own arrays: the IOBinding buffers may already be in use by the caller
+        for batch_size in sorted({1, self.max_batch_size or 32}):
+            self.session.run([self.output_name], {self.input_name: np.zeros((batch_size, 3, 224, 224), dtype=self._input_dtype)})
 
     def _preprocess(self, image):
         # 1. Resize so smaller edge is 256, maintaining aspect ratio
@@ -32,40 +125,159 @@ class ImageEmbedder:
         else:
             new_h = 256
             new_w = int(w * (256 / h))
-        image = image.resize((new_w, new_h), Image.Resampling.LANCZOS)
+        # INTER_AREA averages all source pixels when shrinking; it degrades to nearest-like blockiness when
+        # enlarging, where INTER_LINEAR is the right (and faster) choice
+        interpolation = cv2.INTER_AREA if min(new_w, new_h) < min(w, h) else cv2.INTER_LINEAR
+        img = cv2.resize(np.asarray(image), (new_w, new_h), interpolation=interpolation)
 
-        # 2. Center crop 224x224
-        left = (new_w - 224) / 2
-        top = (new_h - 224) / 2
-        right = (new_w + 224) / 2
-        bottom = (new_h + 224) / 2
-        image = image.crop((left, top, right, bottom))
+        # 2. Center crop 224x224 (a view, no copy)
+        left = (new_w - 224) // 2
+        top = (new_h - 224) // 2
+        img = img[top:top + 224, left:left + 224]
 
-        # 3. Convert to numpy array, scale to [0, 1], and change to CHW format
-        img_np = np.array(image).astype('float32') / 255.0
-        img_np = img_np.transpose((2, 0, 1)) # HWC to CHW
+        # 3. Change to CHW format; the model does the rest
+        if self.raw_pixel_input:
+            return np.ascontiguousarray(img.transpose((2, 0, 1)))
 
-        # 4. Normalize
-        normalized_img = (img_np - self.mean[:, np.newaxis, np.newaxis]) / self.std[:, np.newaxis, np.newaxis]
-        
-        return normalized_img.astype('float32')
+        # 3-4. Cast, scale, normalize and change to CHW format in one lookup pass (numba if installed)
+        out = np.empty((3, 224, 224), dtype=np.float32)
+        if _lut_to_chw is not None:
+            _lut_to_chw(img, self._lut, out)
+        else:
+            for c in range(3):
+                np.take(self._lut[c], img[:, :, c], out=out[c])
+        return out
+
+    def _load_cache(self):
+        if not self._embed_cache_path or not os.path.exists(self._embed_cache_path):
+            return {}
+        with np.load(self._embed_cache_path) as data:
+            keys, vectors = data['keys'], data['vectors']
+        # Entries from other models are useless to this session; drop them
+        return {str(key): vector for key, vector in zip(keys, vectors) if str(key).endswith(self._model_id)}
+
+    def wait_for_warmup(self):
+        if self._warmup_thread is not None:
+            self._warmup_thread.join()
+
+    def save_cache(self):
+        if not self._embed_cache_path or not self._embed_cache:
+            return
+        keys = list(self._embed_cache)
+        np.savez(self._embed_cache_path, keys=np.array(keys), vectors=np.stack([self._embed_cache[k] for k in keys]))
+
+    def _prepare(self, image_path):
+        # Returns (cache key, cached embedding or None, preprocessed tensor or None)
+        with open(image_path, 'rb') as f:
+            data = f.read()
+        key = hashlib.sha256(data).hexdigest() + self._model_id
+        cached = self._embed_cache.get(key)
+        if cached is not None:
+            return key, cached, None
+        return key, None, self._preprocess(Image.open(io.BytesIO(data)).convert("RGB"))
+
+    def _allocate_buffers(self, capacity):
+        self._input_buffer = np.empty((capacity, 3, 224, 224), dtype=self._input_dtype)
+        self._output_buffer = np.empty((capacity,) + self._output_dims, dtype=self._output_dtype) if self._output_dims else None
+
+    def _run(self, tensors):
+        # Run inference once for the whole (B, 3, 224, 224) batch
+        n = len(tensors)
+        if n > len(self._input_buffer):
+            self._allocate_buffers(n)
+        batch = np.stack(tensors, out=self._input_buffer[:n])
+        self._io_binding.bind_ortvalue_input(self.input_name, ort.OrtValue.ortvalue_from_numpy(batch))
+        if self._output_buffer is not None:
+            output = self._output_buffer[:n]
+            self._io_binding.bind_ortvalue_output(self.output_name, ort.OrtValue.ortvalue_from_numpy(output))
+        else:
+            self._io_binding.bind_output(self.output_name, 'cpu')
+        self.session.run_with_iobinding(self._io_binding)
+        if self._output_buffer is None:
+            output = self._io_binding.get_outputs()[0].numpy()
+        # The output buffer is reused by the next batch, so hand back a (float32) copy
+        return output.reshape(n, -1).astype(np.float32)
+
+    def _embed_prepared(self, prepared):
+        # Only cache misses go through the model; their results are added to the cache
+        misses = [i for i, (_, cached, _) in enumerate(prepared) if cached is None]
+        embeddings = [cached for _, cached, _ in prepared]
+        if misses:
+            output = self._run([prepared[i][2] for i in misses])
+            for i, embedding in zip(misses, output):
+                embeddings[i] = self._embed_cache[prepared[i][0]] = embedding
+        if not embeddings:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack(embeddings)
 
     def embed_image(self, image_path):
-        # Load the image
-        image = Image.open(image_path).convert("RGB")
-        
-        # Preprocess the image
-        input_tensor = self._preprocess(image)
-        
-        # Add a batch dimension
-        input_batch = np.expand_dims(input_tensor, axis=0)
+        return self.embed_images([image_path])[0]
+
+    def embed_images(self, image_paths, batch_size=32):
+        if self.max_batch_size:
+            batch_size = min(batch_size, self.max_batch_size)
+
+        embeddings = []
+        for start in range(0, len(image_paths), batch_size):
+            # Load and preprocess the whole chunk, then embed the cache misses as a single batch
+            embeddings.append(self._embed_prepared([self._prepare(p) for p in image_paths[start:start + batch_size]]))
+
+        if not embeddings:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.concatenate(embeddings)
+
+    def iter_embeddings(self, image_paths, batch_size=32, max_workers=None):
+        """Yields (paths, embeddings, failures) per batch while the next batch is preprocessed.
+
+        Decoding and resizing run on a thread pool (PIL and OpenCV release the GIL), and a
+        bounded queue keeps at most two preprocessed batches in flight ahead of inference.
+        Images that fail to load are reported in failures as (path, exception) and skipped.
+        """
+        if self.max_batch_size:
+            batch_size = min(batch_size, self.max_batch_size)
+
+        batches = queue.Queue(maxsize=2)
+        stop = threading.Event()
 
-        # Run inference
-        output = self.session.run([self.output_name], {self.input_name: input_batch})[0]
+        def produce():
+            try:
+                with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as pool:
+                    for start in range(0, len(image_paths), batch_size):
+                        if stop.is_set():
+                            return
+                        chunk = image_paths[start:start + batch_size]
+                        futures = {pool.submit(self._prepare, p): i for i, p in enumerate(chunk)}
+                        prepared = [None] * len(chunk)
+                        failures = []
+                        for future in as_completed(futures):
+                            i = futures[future]
+                            try:
+                                prepared[i] = future.result()
+                            except Exception as e:
+                                failures.append((chunk[i], e))
+                        ok = [i for i, p in enumerate(prepared) if p is not None]
+                        batches.put(([chunk[i] for i in ok], [prepared[i] for i in ok], failures))
+            except Exception as e:
+                batches.put(e)
+            finally:
+                batches.put(None)
 
-        # Flatten the output
-        embedding = output.flatten()
-        return embedding
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+        try:
+            while (item := batches.get()) is not None:
+                if isinstance(item, Exception):
+                    raise item
+                paths, prepared, failures = item
+                yield paths, self._embed_prepared(prepared), failures
+        finally:
+            # Unblock the producer if the caller stopped iterating early
+            stop.set()
+            while producer.is_alive():
+                try:
+                    batches.get(timeout=0.1)
+                except queue.Empty:
+                    pass
 
 if __name__ == '__main__':
     # Example usage:
@@ -5,6 +5,11 @@ import os
 import numpy as np
 import sys
 import time
+import logging
+import hashlib
+import functools
+import queue
+from concurrent.futures import ThreadPoolExecutor
 
 # Add the directory containing the compiled C++ module to the Python path
 # This assumes the module is in the build directory or installed
@@ -26,6 +31,11 @@ except ImportError:
 
 from embedder import ImageEmbedder
 
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = (200, 200)
+THUMBNAIL_POLL_MS = 30 # How often the Tk thread picks up thumbnails decoded on the display pool
+
 class ImageSimilarityApp:
     def __init__(self, root):
         self.root = root
@@ -34,12 +44,29 @@ class ImageSimilarityApp:
         self.embedder = ImageEmbedder()
         self.db = None
         self.db_path = "image_database.bin"
-        self.image_paths = {} # id -> path
+        self.image_paths = {} # path -> (mtime_ns, size, id) of every indexed image
+        self.thumb_dir = "thumbnails" # Small JPEG copies written at index time, so results never decode the originals
+
+        # Decoded thumbnails of recent results; decoding runs on the display pool, off the Tk thread. Finished
+        # decodes are queued and picked up by a poll on the Tk thread, since Tk may only be called from there.
+        # Index-time thumbnail writes get their own pool so display work can never hold them up.
+        self._load_thumbnail = functools.lru_cache(maxsize=256)(self._decode_thumbnail)
+        self._display_pool = ThreadPoolExecutor(max_workers=4)
+        self._thumb_write_pool = ThreadPoolExecutor(max_workers=4)
+        self._decoded_thumbnails = queue.Queue()
 
         self.vector_dimension = 1000 # MobileNetV2 output feature size
+        self.batch_size = 32 # Images per ONNX inference call when indexing
+        # HNSW graph degree and beam widths; cosine ranks by direction, which suits CNN embeddings better than L2
+        self.hnsw_params = {"M": 16, "efConstruction": 200, "efSearch": 64, "metric": vdb.DistanceMetric.COSINE}
+        # Deleted vectors stay in the graph as tombstones that searches can't pass through; past this share of all
+        # stored vectors the index is rebuilt without them
+        self.max_deleted_fraction = 0.2
+        self.fp16_storage = True # Half precision vectors: half the RAM and file size, rankings barely change
 
         self._create_widgets()
         self._load_database()
+        self._poll_thumbnails()
 
     def _create_widgets(self):
         # Frame for database operations
@@ -94,23 +121,29 @@ class ImageSimilarityApp:
     def _load_database(self):
         self._update_status("Loading database...")
         try:
-            print(f"DEBUG: Initializing database with path='{self.db_path}', dimension={self.vector_dimension}, read_only=False")
-            self.db = vdb.Database(self.db_path, self.vector_dimension, read_only=False)
+            logger.debug("Initializing database with path='%s', dimension=%s, read_only=False", self.db_path, self.vector_dimension)
+            self.db = vdb.Database(self.db_path, self.vector_dimension, **self.hnsw_params, read_only=False, fp16_enabled=self.fp16_storage)
             self.db.load()
-            # Reconstruct image_paths from metadata if possible, or clear
-            self.image_paths = {} # For simplicity, clear for now. A real app would store paths in metadata.
+            self._read_image_paths()
             self._update_status(f"Database loaded from {self.db_path}")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load database: {e}")
-            print(f"DEBUG: Initializing empty database with path='{self.db_path}', dimension={self.vector_dimension}, read_only=False after error")
-            self.db = vdb.Database(self.db_path, self.vector_dimension, read_only=False) # Initialize an empty one
+            logger.debug("Initializing empty database with path='%s', dimension=%s, read_only=False after error", self.db_path, self.vector_dimension)
+            self.db = vdb.Database(self.db_path, self.vector_dimension, **self.hnsw_params, read_only=False, fp16_enabled=self.fp16_storage) # Initialize an empty one
+            self.image_paths = {}
             self._update_status("Database initialized (empty)")
 
+    def _read_image_paths(self):
+        # Each vector's metadata holds its image path and file stats, so nothing needs to be re-embedded after a restart
+        self.image_paths = {r.metadata["path"]: (int(r.metadata.get("mtime_ns", -1)), int(r.metadata.get("size", -1)), r.id)
+                            for r in self.db.get_all(include={vdb.Include.ID, vdb.Include.METADATA}) if "path" in r.metadata}
+
     def _save_database(self):
         if self.db:
             self._update_status("Saving database...")
             try:
                 self.db.save()
+                self.embedder.save_cache()
                 self._update_status(f"Database saved to {self.db_path}")
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to save database: {e}")
@@ -125,31 +158,85 @@ class ImageSimilarityApp:
         self._update_status(f"Indexing images from {folder_selected}...")
         image_files = [os.path.join(folder_selected, f) for f in os.listdir(folder_selected) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp'))]
 
-        if not image_files:
-            messagebox.showinfo("Info", "No image files found in the selected folder.")
-            self._update_status("Ready")
-            return
-
-        # Re-initialize database to ensure it's fresh for new indexing
-        print(f"DEBUG: Re-initializing database for indexing with path='{self.db_path}', dimension={self.vector_dimension}, read_only=False")
-        self.db = vdb.Database(self.db_path, self.vector_dimension, read_only=False)
-        self.image_paths = {}
+        if self.db is None:
+            logger.debug("Initializing database for indexing with path='%s', dimension=%s, read_only=False", self.db_path, self.vector_dimension)
+            self.db = vdb.Database(self.db_path, self.vector_dimension, **self.hnsw_params, read_only=False, fp16_enabled=self.fp16_storage)
 
         start_time = time.time()
-        for i, img_path in enumerate(image_files):
-            self._update_status(f"Indexing image {i+1}/{len(image_files)}: {os.path.basename(img_path)}")
+        # Delta indexing: files whose mtime and size match the database are kept as they are; new and changed
+        # files are embedded, and the vectors of changed or removed files are deleted
+        file_stats = {}
+        for img_path in image_files:
             try:
-                embedding = self.embedder.embed_image(img_path)
-                # Store image path in metadata
-                metadata = {"path": img_path}
-                print(f"DEBUG: Inserting into database: embedding_length={len(embedding.tolist())}, metadata={metadata}")
-                node_id = self.db.insert(embedding.tolist(), metadata)
-                self.image_paths[node_id] = img_path
+                st = os.stat(img_path)
+                file_stats[img_path] = (st.st_mtime_ns, st.st_size)
+            except OSError as e:
+                logger.error("Error reading %s: %s", img_path, e)
+        folder = os.path.abspath(folder_selected)
+        stale_paths = {p for p, (mtime_ns, size, _) in self.image_paths.items()
+                       if (p in file_stats and file_stats[p] != (mtime_ns, size))
+                       or (p not in file_stats and os.path.dirname(os.path.abspath(p)) == folder)}
+        image_files = [p for p in file_stats if p not in self.image_paths or p in stale_paths]
+
+        if not image_files and not stale_paths:
+            if file_stats:
+                self._update_status(f"Index is up to date. {len(file_stats)} images in {folder_selected}.")
+            else:
+                messagebox.showinfo("Info", "No image files found in the selected folder.")
+                self._update_status("Ready")
+            return
+
+        logger.debug("Delta index: %d new or changed, %d stale, %d unchanged", len(image_files), len(stale_paths), len(file_stats) - len(image_files))
+        for img_path in stale_paths:
+            self.db.delete_vector(self.image_paths.pop(img_path)[2])
+            if img_path not in file_stats:
+                self._remove_thumbnail(img_path)
+
+        # Collect everything first, then hand all vectors to the database in one call
+        embeddings = np.empty((len(image_files), self.vector_dimension), dtype=np.float32)
+        metadatas = []
+        num_done = 0
+        os.makedirs(self.thumb_dir, exist_ok=True)
+        thumb_futures = {}
+        for batch_files, batch_embeddings, failures in self.embedder.iter_embeddings(image_files, batch_size=self.batch_size):
+            for img_path, e in failures:
+                logger.error("Error embedding %s: %s", img_path, e)
+            if batch_files:
+                embeddings[len(metadatas):len(metadatas) + len(batch_files)] = batch_embeddings
+                # Store image path and the file stats it was embedded from in metadata
+                metadatas.extend({"path": img_path, "mtime_ns": str(file_stats[img_path][0]), "size": str(file_stats[img_path][1])}
+                                 for img_path in batch_files)
+                # Thumbnails are written on the pool while the next batch is embedded
+                for img_path in batch_files:
+                    thumb_futures[img_path] = self._thumb_write_pool.submit(self._write_thumbnail, img_path)
+            num_done += len(batch_files) + len(failures)
+            logger.debug("Embedded batch: %d images, %d failed, %d/%d done", len(batch_files), len(failures), num_done, len(image_files))
+            self._update_status(f"Embedding images {num_done}/{len(image_files)}")
+
+        for metadata in metadatas:
+            try:
+                metadata["thumb_path"] = thumb_futures[metadata["path"]].result()
             except Exception as e:
-                print(f"Error embedding or inserting {img_path}: {e}")
+                logger.error("Error writing thumbnail for %s: %s", metadata["path"], e)
+        self._load_thumbnail.cache_clear() # Thumbnails of changed images were just rewritten
+
+        self._update_status(f"Building index for {len(metadatas)} images...")
+        logger.debug("Bulk inserting into database: num_embeddings=%d, embedding_length=%d", len(metadatas), embeddings.shape[1])
+        node_ids = self.db.bulk_insert(embeddings[:len(metadatas)], metadatas, defer_index=True)
+        self.db.build_index()
+        for node_id, metadata in zip(node_ids, metadatas):
+            self.image_paths[metadata["path"]] = (*file_stats[metadata["path"]], node_id)
+
+        num_deleted = self.db.num_deleted()
+        if num_deleted > self.max_deleted_fraction * (num_deleted + len(self.image_paths)):
+            self._update_status(f"Rebuilding index to drop {num_deleted} deleted entries...")
+            logger.debug("Rebuilding index: %d deleted, %d live", num_deleted, len(self.image_paths))
+            self.db.rebuild_index()
+            self._read_image_paths() # Rebuilding renumbers the IDs
         
         end_time = time.time()
-        self._update_status(f"Indexing complete. {len(image_files)} images indexed in {end_time - start_time:.2f} seconds.")
+        self._update_status(f"Indexing complete. {len(image_files)} new or changed images indexed, {len(stale_paths)} outdated entries removed, "
+                            f"in {end_time - start_time:.2f} seconds.")
         self._save_database() # Automatically save after indexing
 
     def _select_query_image(self):
@@ -173,8 +260,8 @@ class ImageSimilarityApp:
             k = int(self.num_results_entry.get())
             
             # Query the database, requesting metadata to get the original image paths
-            print(f"DEBUG: Querying database with query_embedding_length={len(query_embedding.tolist())}, k={k}, include={{vdb.Include.ID, vdb.Include.DISTANCE, vdb.Include.METADATA}}")
-            results = self.db.query(query_embedding.tolist(), k, include={vdb.Include.ID, vdb.Include.DISTANCE, vdb.Include.METADATA})
+            query_embedding = np.ascontiguousarray(query_embedding, dtype=np.float32)
+            results = self.db.query(query_embedding, k, include={vdb.Include.ID, vdb.Include.DISTANCE, vdb.Include.METADATA})
 
             self._update_status(f"Search complete. Found {len(results)} results.")
             self._display_results(results)
@@ -183,11 +270,49 @@ class ImageSimilarityApp:
             messagebox.showerror("Error", f"Error during query: {e}")
             self._update_status("Ready")
 
+    @staticmethod
+    def _decode_thumbnail(image_path):
+        img = Image.open(image_path)
+        img.thumbnail(THUMBNAIL_SIZE) # Resize for display; JPEGs are decoded at reduced scale directly
+        img.load()
+        return img
+
+    def _thumbnail_path(self, image_path):
+        thumb_name = hashlib.sha1(os.path.abspath(image_path).encode("utf-8")).hexdigest() + ".jpg"
+        return os.path.join(self.thumb_dir, thumb_name)
+
+    def _write_thumbnail(self, image_path):
+        thumb_path = self._thumbnail_path(image_path)
+        self._decode_thumbnail(image_path).convert("RGB").save(thumb_path, "JPEG", quality=85)
+        return thumb_path
+
+    def _remove_thumbnail(self, image_path):
+        try:
+            os.remove(self._thumbnail_path(image_path))
+        except OSError:
+            pass
+
     def _display_image(self, image_path, panel, text_label):
+        # Decode on the display pool and only create the PhotoImage back on the Tk thread
+        request = object()
+        panel.image_request = request
+        future = self._display_pool.submit(self._load_thumbnail, image_path)
+        future.add_done_callback(lambda f: self._decoded_thumbnails.put((f, image_path, panel, text_label, request)))
+
+    def _poll_thumbnails(self):
+        while True:
+            try:
+                finished = self._decoded_thumbnails.get_nowait()
+            except queue.Empty:
+                break
+            self._show_thumbnail(*finished)
+        self.root.after(THUMBNAIL_POLL_MS, self._poll_thumbnails)
+
+    def _show_thumbnail(self, future, image_path, panel, text_label, request):
+        if getattr(panel, "image_request", None) is not request:
+            return # A newer image was requested for this panel in the meantime
         try:
-            img = Image.open(image_path)
-            img.thumbnail((200, 200)) # Resize for display
-            img_tk = ImageTk.PhotoImage(img)
+            img_tk = ImageTk.PhotoImage(future.result())
             panel.config(image=img_tk, text=text_label, compound="top")
             panel.image = img_tk # Keep a reference!
         except Exception as e:
@@ -199,16 +324,21 @@ class ImageSimilarityApp:
             if i < len(results):
                 result = results[i]
                 result_path = result.metadata.get("path", "N/A")
+                thumb_path = result.metadata.get("thumb_path")
+                if thumb_path and os.path.exists(thumb_path):
+                    result_path = thumb_path
                 distance = result.distance
                 
                 label.config(text=f"Result {i+1} (Dist: {distance:.4f})")
-                self._display_image(result_path, label, f"Result {i+1}")
+                self._display_image(result_path, label, f"Result {i+1} (Dist: {distance:.4f})")
             else:
                 label.config(image="", text=f"Result {i+1}")
                 label.image = None
+                label.image_request = None
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
     root = tk.Tk()
     app = ImageSimilarityApp(root)
     root.geometry("1000x700") # Set initial window size
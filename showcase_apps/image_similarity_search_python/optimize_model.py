@@ -0,0 +1,172 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import onnx
+from onnx import TensorProto, helper, numpy_helper, version_converter
+from onnxconverter_common import float16
+from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+from PIL import Image
+
+from embedder import IMAGENET_MEAN, IMAGENET_STD, ImageEmbedder, variant_path
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp')
+
+# The quantizer needs opset >= 11; the model zoo MobileNetV2 ships with opset 7
+MIN_OPSET = 13
+
+
+def _list_images(folder, limit=None):
+    files = sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.lower().endswith(IMAGE_EXTENSIONS))
+    return files[:limit] if limit else files
+
+
+class ImageCalibrationReader(CalibrationDataReader):
+    def __init__(self, embedder, image_files):
+        self.embedder = embedder
+        self.input_name = embedder.input_name
+        self.image_files = iter(image_files)
+
+    def get_next(self):
+        image_path = next(self.image_files, None)
+        if image_path is None:
+            return None
+        input_tensor = self.embedder._preprocess(Image.open(image_path).convert("RGB"))
+        return {self.input_name: input_tensor[np.newaxis]}
+
+
+def _modernize(model):
+    opset = next(o.version for o in model.opset_import if o.domain in ("", "ai.onnx"))
+    if opset < MIN_OPSET:
+        model = version_converter.convert_version(model, MIN_OPSET)
+        # The converter keeps the old IR version; IR >= 4 is needed for initializers that aren't graph inputs
+        model.ir_version = max(model.ir_version, helper.find_min_ir_version_for(model.opset_import))
+    # Old exporters list every weight as a graph input too, which stops ORT from constant folding them
+    initializer_names = {init.name for init in model.graph.initializer}
+    inputs = [i for i in model.graph.input if i.name not in initializer_names]
+    del model.graph.input[:]
+    model.graph.input.extend(inputs)
+    return model
+
+
+def fuse_normalization(model):
+    # Make the graph take raw uint8 CHW pixels: Cast -> Sub(255 * mean) -> Mul(1 / (255 * std)) -> original graph.
+    # The constants can't be folded into the first Conv's weights because its zero padding would then pad with
+    # -mean / std instead of 0, but ORT runs them as vectorized elementwise ops and the Python side only has
+    # to transpose the uint8 crop.
+    graph = model.graph
+    graph_input = graph.input[0]
+    raw_name = graph_input.name
+    normalized_name = f"{raw_name}_normalized"
+    for node in graph.node:
+        node.input[:] = [normalized_name if name == raw_name else name for name in node.input]
+
+    mean = (255.0 * np.array(IMAGENET_MEAN, dtype=np.float32)).reshape(1, 3, 1, 1)
+    inv_std = (1.0 / (255.0 * np.array(IMAGENET_STD, dtype=np.float32))).reshape(1, 3, 1, 1)
+    graph.initializer.extend([numpy_helper.from_array(mean, "pixel_mean"),
+                              numpy_helper.from_array(inv_std, "pixel_inv_std")])
+    prologue = [
+        helper.make_node("Cast", [raw_name], [f"{raw_name}_float"], to=TensorProto.FLOAT),
+        helper.make_node("Sub", [f"{raw_name}_float", "pixel_mean"], [f"{raw_name}_centered"]),
+        helper.make_node("Mul", [f"{raw_name}_centered", "pixel_inv_std"], [normalized_name]),
+    ]
+    for i, node in enumerate(prologue):
+        graph.node.insert(i, node)
+    graph_input.type.tensor_type.elem_type = TensorProto.UINT8
+    onnx.checker.check_model(model)
+    return model
+
+
+def build_fp32(model_path, output_path):
+    onnx.save(fuse_normalization(_modernize(onnx.load(model_path))), output_path)
+
+
+def convert_fp16(fp32_path, output_path):
+    # keep_io_types leaves the uint8 input and float32 output alone, so the embedder feeds it exactly like fp32
+    model = float16.convert_float_to_float16(onnx.load(fp32_path), keep_io_types=True)
+    # The converter doesn't retarget Cast nodes, so the normalization prologue would still produce float32
+    for node in model.graph.node:
+        if node.op_type == "Cast" and node.input[0] == model.graph.input[0].name:
+            for attr in node.attribute:
+                if attr.name == "to":
+                    attr.i = TensorProto.FLOAT16
+    onnx.checker.check_model(model)
+    onnx.save(model, output_path)
+
+
+def quantize_int8(fp32_path, output_path, calibration_dir, num_calibration_images=300):
+    # Static QDQ quantization: activation ranges come from real images, so ORT can fuse the QDQ pairs into
+    # integer convs. Dynamic quantization is deliberately not offered: it computes activation ranges per
+    # call (DynamicQuantizeLinear + ConvInteger on every layer), which makes MobileNetV2 several times
+    # slower than FP32 on CPU.
+    embedder = ImageEmbedder(fp32_path, precision=None, cache_path=None, warmup=False)
+    reader = ImageCalibrationReader(embedder, _list_images(calibration_dir, num_calibration_images))
+    quantize_static(fp32_path, output_path, reader, quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+
+
+def _time_batch(embedder, image_files, repeats=10):
+    # Median wall time of one inference over the preprocessed batch, after an untimed first run. Preprocessing is
+    # not timed, so this leaves out what the fused fp32 variant saves on the Python side.
+    tensors = [embedder._preprocess(Image.open(p).convert("RGB")) for p in image_files]
+    embedder.wait_for_warmup()
+    embedder._run(tensors)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        embedder._run(tensors)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def validate(model_path, precision, validation_dir, k=5, batch_size=32):
+    reference = ImageEmbedder(model_path, precision=None, cache_path=None)
+    candidate = ImageEmbedder(model_path, precision=precision, cache_path=None)
+    if candidate.model_path == reference.model_path:
+        print(f"No {precision} variant of {model_path} found, skipping")
+        return
+    image_files = _list_images(validation_dir)
+    if not image_files:
+        print(f"No images found in {validation_dir}")
+        return
+    overlaps = []
+    for image_path in image_files:
+        ref_top = set(np.argsort(reference.embed_image(image_path))[-k:])
+        cand_top = set(np.argsort(candidate.embed_image(image_path))[-k:])
+        overlaps.append(len(ref_top & cand_top) / k)
+    print(f"Top-{k} agreement of {precision} vs the original model over {len(overlaps)} images: {np.mean(overlaps):.3f}")
+
+    batch = image_files[:min(batch_size, candidate.max_batch_size or batch_size)]
+    ref_time, cand_time = _time_batch(reference, batch), _time_batch(candidate, batch)
+    print(f"Batch of {len(batch)}: {precision} {cand_time * 1000:.1f} ms vs original {ref_time * 1000:.1f} ms "
+          f"({ref_time / cand_time:.2f}x)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build optimized variants of the MobileNetV2 embedding model.")
+    parser.add_argument("--model", default="models/mobilenetv2-7.onnx", help="Path to the FP32 ONNX model.")
+    parser.add_argument("--calibration-dir", help="Folder of sample images for static INT8 quantization (no INT8 model if omitted).")
+    parser.add_argument("--num-calibration-images", type=int, default=300)
+    parser.add_argument("--validation-dir", help="Folder of images used to report top-k drift against the original model.")
+    args = parser.parse_args()
+
+    fp32_path = variant_path(args.model, "fp32")
+    print(f"Fusing input normalization into {args.model} -> {fp32_path}...")
+    build_fp32(args.model, fp32_path)
+
+    fp16_path = variant_path(args.model, "fp16")
+    print(f"Converting {fp32_path} -> {fp16_path}...")
+    convert_fp16(fp32_path, fp16_path)
+
+    if args.calibration_dir:
+        int8_path = variant_path(args.model, "int8")
+        print(f"Quantizing {fp32_path} -> {int8_path}...")
+        quantize_int8(fp32_path, int8_path, args.calibration_dir, args.num_calibration_images)
+    else:
+        print("Skipping INT8: pass --calibration-dir to build a statically quantized model.")
+    print("Done.")
+
+    if args.validation_dir:
+        for precision in ("fp32", "fp16", "int8"):
+            validate(args.model, precision, args.validation_dir)